@@ -0,0 +1,146 @@
+"""Base class shared by the real and virtual monochromator instrument objects."""
+
+import abc
+import collections
+
+# numeric instrument setting: property name, query command, %-style format of the
+# command that changes it, numeric type, and property docstring
+_Setting = collections.namedtuple("_Setting", "name query set_fmt cast doc")
+
+_CMD_GOTO = b"%.1f GOTO"
+
+# settings in the order they are applied when changed together, i.e. the turret and
+# grating are selected before moving to a wavelength
+SETTINGS = (
+    _Setting(
+        "scan_speed", "?NM/MIN", b"%.1f NM/MIN", float, "Grating scan speed in nm/min."
+    ),
+    _Setting("turret", "?TURRET", b"%d TURRET", int, "Turret number."),
+    _Setting("grating", "?GRATING", b"%d GRATING", int, "Grating number."),
+    _Setting("filter", "?FILTER", b"%d FILTER", int, "Filter wheel position number."),
+    _Setting(
+        "wavelength", "?NM", _CMD_GOTO, float, "Grating wavelength position in nm."
+    ),
+)
+
+
+def _hook_accessors(setting):
+    """Build a getter and setter for a setting that call the `_read`/`_write` hooks.
+
+    Parameters
+    ----------
+    setting : _Setting
+        Description of the setting.
+
+    Returns
+    -------
+    fget, fset : callable
+        Getter and setter for the setting.
+    """
+
+    def fget(self):
+        return self._read(setting)
+
+    def fset(self, value):
+        # write directly rather than through configure, where None means unchanged
+        self._write([(setting, value)])
+
+    return fget, fset
+
+
+def _add_settings(accessors):
+    """Build a class decorator installing a property for each numeric setting.
+
+    Parameters
+    ----------
+    accessors : callable
+        Function taking a `_Setting` and returning its getter and setter.
+
+    Returns
+    -------
+    decorator : callable
+        Class decorator.
+    """
+
+    def decorator(cls):
+        for setting in SETTINGS:
+            fget, fset = accessors(setting)
+            setattr(cls, setting.name, property(fget, fset, doc=setting.doc))
+
+        return cls
+
+    return decorator
+
+
+class sp2150_base(abc.ABC):
+    """Base monochromator instrument object.
+
+    Subclasses install the numeric setting properties with `_add_settings` and
+    provide the `_write` hook used by `configure`.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        """Enter the runtime context related to this object."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context related to this object."""
+        self.disconnect()
+
+    @abc.abstractmethod
+    def connect(self, resource_name, resource_manager=None, **resource_kwargs):
+        """Connect to the instrument."""
+
+    @abc.abstractmethod
+    def disconnect(self):
+        """Disconnect instrument."""
+
+    def configure(
+        self, scan_speed=None, turret=None, grating=None, filter=None, wavelength=None
+    ):
+        """Change several settings at once.
+
+        Settings left as `None` are not changed. The rest are applied in the order of
+        the parameters so the turret and grating are selected before moving to the
+        wavelength.
+
+        Parameters
+        ----------
+        scan_speed : float, optional
+            Grating scan speed in nm/min.
+        turret : int, optional
+            Turret number.
+        grating : int, optional
+            Grating number.
+        filter : int, optional
+            Filter wheel position number.
+        wavelength : float, optional
+            Grating wavelength position in nm.
+        """
+        values = {
+            "scan_speed": scan_speed,
+            "turret": turret,
+            "grating": grating,
+            "filter": filter,
+            "wavelength": wavelength,
+        }
+        changes = [
+            (setting, values[setting.name])
+            for setting in SETTINGS
+            if values[setting.name] is not None
+        ]
+
+        if changes:
+            self._write(changes)
+
+    @abc.abstractmethod
+    def _write(self, changes):
+        """Write one or more numeric settings.
+
+        Parameters
+        ----------
+        changes : list of tuple
+            (setting, value) pairs to write, in order.
+        """
@@ -0,0 +1,117 @@
+"""Command line functions shared by the real and virtual instrument CLIs."""
+
+import argparse
+import asyncio
+
+# map each cli function name to a callable taking the instrument object and the
+# cli parameter, returning a value to print or `None`
+_CLI = {
+    "set_scan_speed": lambda mono, param: setattr(mono, "scan_speed", param),
+    "get_scan_speed": lambda mono, param: mono.scan_speed,
+    "scan_to_wavelength": lambda mono, param: mono.scan_to_wavelength(float(param)),
+    "goto_wavelength": lambda mono, param: setattr(mono, "wavelength", param),
+    "get_wavelength": lambda mono, param: mono.wavelength,
+    "set_grating": lambda mono, param: setattr(mono, "grating", param),
+    "get_grating": lambda mono, param: mono.grating,
+    "set_turret": lambda mono, param: setattr(mono, "turret", param),
+    "get_turret": lambda mono, param: mono.turret,
+    "get_grating_info": lambda mono, param: mono.grating_info,
+    # "get_turret_info": lambda mono, param: mono.turret_info,
+    "set_filter": lambda mono, param: setattr(mono, "filter", param),
+    "get_filter": lambda mono, param: mono.filter,
+    "home_filter": lambda mono, param: mono.home_filter(),
+}
+
+# cli functions that consume a parameter
+_TAKES_PARAMETER = {
+    "set_scan_speed",
+    "scan_to_wavelength",
+    "goto_wavelength",
+    "set_grating",
+    "set_turret",
+    "set_filter",
+}
+
+
+def _parse_args(with_timeout):
+    """Parse and validate the command line arguments.
+
+    Parameters
+    ----------
+    with_timeout : bool
+        Whether to accept a communications timeout option.
+
+    Returns
+    -------
+    args : argparse.Namespace
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--resource-name", help="Instrument resource name")
+    parser.add_argument(
+        "function",
+        nargs="+",
+        help="function(s) to call",
+        choices=list(_CLI),
+    )
+    parser.add_argument(
+        "-p",
+        "--parameter",
+        action="append",
+        help=(
+            "Parameter for function, i.e. wavelength in nm, grating number, turret "
+            + "number, filter number. Repeat for each function that takes one."
+        ),
+    )
+    if with_timeout:
+        parser.add_argument(
+            "-t",
+            "--timeout",
+            type=int,
+            help=("Communications timeout in ms"),
+            default=30000,
+        )
+    args = parser.parse_intermixed_args()
+
+    # every function that takes a parameter needs exactly one
+    n_expected = sum(function in _TAKES_PARAMETER for function in args.function)
+    n_given = len(args.parameter or [])
+    if n_given != n_expected:
+        parser.error(
+            f"the functions given take {n_expected} parameter(s) but {n_given} "
+            + "-p/--parameter value(s) were given"
+        )
+
+    return args
+
+
+async def _run(mono, functions, parameters):
+    """Run cli functions concurrently, printing their results in order.
+
+    Parameters are handed out in order to the functions that take one, so there
+    must be exactly one for each of them. The calls
+    are all queued at once so no time is lost between them, but the instrument still
+    handles them in the order given.
+
+    Parameters
+    ----------
+    mono : sp2150
+        Connected instrument object.
+    functions : list of str
+        Names of cli functions to call.
+    parameters : list of str or None
+        Parameters for the functions that take one.
+    """
+    parameters = iter(parameters or [])
+    calls = [
+        (function, next(parameters) if function in _TAKES_PARAMETER else None)
+        for function in functions
+    ]
+
+    results = await asyncio.gather(
+        *(mono._arun(_CLI[function], mono, param) for function, param in calls)
+    )
+
+    for result in results:
+        if result is not None:
+            print(result)
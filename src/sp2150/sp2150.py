@@ -1,24 +1,109 @@
 """Acton SP2150 monochromator control library."""
 
-import pyvisa
+import asyncio
+import concurrent.futures
+import functools
+import queue
+import re
+import threading
+import time
 
+if __package__:
+    from ._base import _CMD_GOTO, SETTINGS, _add_settings, _hook_accessors, sp2150_base
+else:
+    # run as a script rather than as part of the package
+    from _base import _CMD_GOTO, SETTINGS, _add_settings, _hook_accessors, sp2150_base
 
-class sp2150:
+# numeric value in a response, ignoring any leading space and trailing unit
+_NUM_RE = re.compile(r"-?\d+(?:\.\d*)?")
+
+# write termination for commands sent with write_raw
+_WRITE_TERMINATION = b"\r"
+
+# preformatted commands, including the write termination
+_CMD_NM = b"%.1f NM\r"
+_CMD_NM_VERIFY = b"%.1f NM ?NM\r"
+_CMD_FHOME = b"FHOME\r"
+
+# resource manager shared by connections that don't provide their own, created on
+# first use because initialising a VISA backend can take seconds
+_default_rm = None
+_rm_lock = threading.Lock()
+
+
+def _parse_number(cmd, resp):
+    """Get the numeric value from a response.
+
+    Parameters
+    ----------
+    cmd : str or bytes
+        Command that was sent, used in the error message.
+    resp : str
+        Response to the command.
+
+    Returns
+    -------
+    value : str
+        Numeric value with any leading space and trailing unit removed.
+
+    Raises
+    ------
+    RuntimeError
+        If the response doesn't contain a number.
+    """
+    match = _NUM_RE.search(resp)
+    if match is None:
+        raise RuntimeError(f"Unexpected response to {cmd!r}: {resp!r}")
+
+    return match.group()
+
+
+def _on_worker(func):
+    """Run an instrument method on the instrument's I/O worker thread."""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return self._call(func, self, *args, **kwargs)
+
+    return wrapper
+
+
+@_add_settings(_hook_accessors)
+class sp2150(sp2150_base):
     """Monochromator instrument object."""
 
     def __init__(self):
         """Construct object."""
         self._write_termination = "\r"
         self._read_termination = " ok\r\n"
+        self._chunk_size = 64 * 1024
         self.instr = None
 
-    def __enter__(self):
-        """Enter the runtime context related to this object."""
-        return self
+        # bound methods of the instrument, looked up once on connection
+        self._instr_query = None
+        self._write_raw = None
+        self._read_raw = None
+
+        # time in s that a property reading is reused for, 0 disables caching
+        self.cache_ttl = 0.05
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        """Exit the runtime context related to this object."""
-        self.disconnect()
+        # read multi-line responses in raw blocks rather than one byte at a time,
+        # leave disabled if the firmware's responses aren't received correctly this way
+        self.binary_info = False
+
+        self._queue = queue.Queue()
+        self._worker = None
+
+        # queued or running queries, shared by callers asking the same thing
+        self._inflight = {}
+        self._inflight_lock = threading.RLock()
+
+        # property readings, and a counter bumped whenever they are invalidated so a
+        # reading that was in flight during a setter isn't cached afterwards
+        self._cache = {}
+        self._cache_generation = 0
+        self._cache_lock = threading.Lock()
+        self._grating_info_cache = None
 
     def connect(self, resource_name, resource_manager=None, **resource_kwargs):
         """Connect to the instrument.
@@ -30,27 +115,184 @@ class sp2150:
             https://pyvisa.readthedocs.io/en/latest/introduction/names.html for more
             info on correct formatting for resource names.
         resource_manager : pyvisa.ResourceManager, optional
-            Resource manager used to create new connection. If `None`, create a new
-            resource manager using system set VISA backend.
+            Resource manager used to create new connection. If `None`, use a
+            resource manager shared by all instruments in this process, creating it
+            with the system set VISA backend on first use.
         resource_kwargs : dict
             Keyword arguments passed to PyVISA resource to be used to change
             instrument attributes after construction.
         """
         if resource_manager is None:
-            resource_manager = pyvisa.ResourceManager()
+            # imported here so the package, and the virtual instrument that shares
+            # its base class, can be used without pyvisa installed
+            import pyvisa
+
+            global _default_rm
+            with _rm_lock:
+                if _default_rm is None:
+                    _default_rm = pyvisa.ResourceManager()
+            resource_manager = _default_rm
         self.instr = resource_manager.open_resource(resource_name, **resource_kwargs)
 
+        # read whole responses, including the multi-line grating info, in one go
+        # rather than many small reads
+        if "chunk_size" not in resource_kwargs:
+            self.instr.chunk_size = self._chunk_size
+
         # set instrument termchars
         self.instr.write_termination = self._write_termination
         self.instr.read_termination = self._read_termination
 
+        # bind the methods used on every call once rather than per call
+        self._instr_query = self.instr.query
+        self._write_raw = self.instr.write_raw
+        self._read_raw = self.instr.read_raw
+
         # disable echo
-        self.instr.query("NO-ECHO")
+        self._instr_query("NO-ECHO")
+
+        # hand all further instrument I/O to a dedicated thread so slow VISA calls
+        # don't hold up other work in the calling thread
+        self._worker = threading.Thread(target=self._run_worker, daemon=True)
+        self._worker.start()
 
     def disconnect(self):
         """Disconnect instrument."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        self._invalidate(None)
+        self._grating_info_cache = None
         self.instr.close()
 
+    def _run_worker(self):
+        """Run queued instrument calls in order until a `None` sentinel arrives."""
+        while (item := self._queue.get()) is not None:
+            fut, func, args, kwargs = item
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(func(*args, **kwargs))
+                except BaseException as err:
+                    fut.set_exception(err)
+
+    def _submit(self, func, *args, **kwargs):
+        """Queue an instrument call on the worker thread.
+
+        Parameters
+        ----------
+        func : callable
+            Function to call.
+        args : tuple
+            Positional arguments passed to `func`.
+        kwargs : dict
+            Keyword arguments passed to `func`.
+
+        Returns
+        -------
+        fut : concurrent.futures.Future
+            Future resolved with the return value of `func`.
+        """
+        fut = concurrent.futures.Future()
+        self._queue.put((fut, func, args, kwargs))
+        return fut
+
+    def _call(self, func, *args, **kwargs):
+        """Call a function on the worker thread and wait for the result.
+
+        Calls made before connecting, or from the worker thread itself, run
+        directly.
+
+        Parameters
+        ----------
+        func : callable
+            Function to call.
+        args : tuple
+            Positional arguments passed to `func`.
+        kwargs : dict
+            Keyword arguments passed to `func`.
+
+        Returns
+        -------
+        result
+            Return value of `func`.
+        """
+        if self._worker is None or threading.current_thread() is self._worker:
+            return func(*args, **kwargs)
+
+        return self._submit(func, *args, **kwargs).result()
+
+    async def _arun(self, func, *args, **kwargs):
+        """Run a blocking instrument call without blocking the event loop.
+
+        As with `_call`, calls made before connecting, or from the worker thread
+        itself, run directly since nothing would pick them up from the queue.
+
+        Parameters
+        ----------
+        func : callable
+            Blocking function to call.
+        args : tuple
+            Positional arguments passed to `func`.
+        kwargs : dict
+            Keyword arguments passed to `func`.
+
+        Returns
+        -------
+        result
+            Return value of `func`.
+        """
+        if self._worker is None or threading.current_thread() is self._worker:
+            return func(*args, **kwargs)
+
+        return await asyncio.wrap_future(self._submit(func, *args, **kwargs))
+
+    async def aquery(self, cmd):
+        """Query a command asynchronously.
+
+        Parameters
+        ----------
+        cmd : str
+            Command to query.
+
+        Returns
+        -------
+        resp : str
+            Response to command.
+        """
+        return await self._arun(self._instr_query, cmd)
+
+    async def aget(self, name):
+        """Get a property asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Property name, e.g. "wavelength".
+
+        Returns
+        -------
+        value
+            Property value.
+        """
+        return await self._arun(getattr, self, name)
+
+    async def aset(self, name, value):
+        """Set a property asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Property name, e.g. "wavelength".
+        value
+            New property value.
+        """
+        await self._arun(setattr, self, name, value)
+
+    async def ascan_to_wavelength(self, wavelength):
+        """Scan grating to wavelength in nm asynchronously."""
+        await self._arun(self.scan_to_wavelength, wavelength)
+
     def _query(self, cmd):
         """Query a command, stripping space at beginning of the response and the unit.
 
@@ -61,6 +303,9 @@ class sp2150:
         values with the correct numeric type. The unit of a property can be found in
         its docstring.
 
+        If an identical query from another thread is already waiting for the
+        instrument, its result is shared rather than sending the command again.
+
         Parameters
         ----------
         cmd : str
@@ -71,8 +316,59 @@ class sp2150:
         resp : str
             Response to command with receding space and unit stripped.
         """
-        return self.instr.query(cmd)[1:].split(" ")[0]
+        if self._worker is None or threading.current_thread() is self._worker:
+            return _parse_number(cmd, self._instr_query(cmd))
+
+        with self._inflight_lock:
+            fut = self._inflight.get(cmd)
+            if fut is None:
+                fut = self._submit(self._query, cmd)
+                self._inflight[cmd] = fut
+                fut.add_done_callback(functools.partial(self._query_done, cmd))
+
+        return fut.result()
+
+    def _query_done(self, cmd, fut):
+        """Stop sharing a query once it has completed.
+
+        Parameters
+        ----------
+        cmd : str
+            Command that was queried.
+        fut : concurrent.futures.Future
+            Future of the completed query.
+        """
+        with self._inflight_lock:
+            if self._inflight.get(cmd) is fut:
+                del self._inflight[cmd]
+
+    @_on_worker
+    def _command(self, cmd):
+        """Write a preformatted command and read its acknowledgement.
+
+        Parameters
+        ----------
+        cmd : bytes
+            Command, including the write termination.
+
+        Returns
+        -------
+        resp : bytes
+            Raw response, including any query results and the acknowledgement.
 
+        Raises
+        ------
+        RuntimeError
+            If the response doesn't end with the acknowledgement.
+        """
+        self._write_raw(cmd)
+        resp = self._read_raw()
+        if not resp.endswith(self._read_termination.encode("ASCII")):
+            raise RuntimeError(f"Command not acknowledged: {cmd!r} returned {resp!r}")
+
+        return resp
+
+    @_on_worker
     def _query_manual(self, cmd):
         """Query a command manually looking for the termination character.
 
@@ -80,6 +376,9 @@ class sp2150:
         handle properly. This can be circumvented by reading characters one at a
         time and manually checking for the termination character.
 
+        If `binary_info` is `True`, the response is read in raw blocks of up to
+        `chunk_size` bytes instead, which needs far fewer reads.
+
         Parameters
         ----------
         cmd : str
@@ -92,23 +391,134 @@ class sp2150:
         """
         resp = b""
         self.instr.write(cmd)
-        while resp.endswith(self._read_termination.encode("ASCII")) is False:
-            resp += self.instr.read_bytes(1)
+        if self.binary_info:
+            while resp.endswith(self._read_termination.encode("ASCII")) is False:
+                resp += self._read_raw(self.instr.chunk_size)
+        else:
+            while resp.endswith(self._read_termination.encode("ASCII")) is False:
+                resp += self.instr.read_bytes(1)
+
+        # remove the termination as a suffix, str.strip would treat it as a set of
+        # characters and could also eat trailing letters of the response
+        return resp[: -len(self._read_termination)].decode("ASCII").strip()
+
+    @_on_worker
+    def snapshot(self):
+        """Read all numeric instrument settings in a single query.
+
+        The instrument accepts several space-separated commands on one line so the
+        state can be read with one round-trip instead of one per property. The values
+        are cached and returned by the property getters for `cache_ttl` seconds or
+        until the next setter call.
 
-        return resp.decode("ASCII").strip(self._read_termination)
+        Returns
+        -------
+        state : dict
+            Current wavelength, grating, turret, filter, and scan speed.
 
-    @property
-    def scan_speed(self):
-        """Get grating scan speed in nm/min."""
-        return float(self._query("?NM/MIN"))
+        Raises
+        ------
+        RuntimeError
+            If the response doesn't contain a value for every setting.
+        """
+        resp = self._instr_query(" ".join(setting.query for setting in SETTINGS))
 
-    @scan_speed.setter
-    def scan_speed(self, speed):
-        """Set grating scan speed in nm/min."""
-        self.instr.query(f"{float(speed):.1f} NM/MIN")
+        # pick out the numbers, skipping the wavelength and scan speed units
+        values = _NUM_RE.findall(resp)
+        if len(values) != len(SETTINGS):
+            raise RuntimeError(f"Unexpected response to state query: {resp!r}")
 
-    def scan_to_wavelength(self, wavelength):
-        """Scan grating to wavelength in nm."""
+        state = {
+            setting.name: setting.cast(value)
+            for setting, value in zip(SETTINGS, values)
+        }
+
+        timestamp = time.monotonic()
+        with self._cache_lock:
+            self._cache = {name: (value, timestamp) for name, value in state.items()}
+
+        return state
+
+    def _read(self, setting):
+        """Read a numeric setting, reusing a recent reading if there is one.
+
+        Parameters
+        ----------
+        setting : _Setting
+            Setting to read.
+
+        Returns
+        -------
+        value : int or float
+            Value of the setting.
+        """
+        with self._cache_lock:
+            cached = self._cache.get(setting.name)
+            generation = self._cache_generation
+
+        if cached is not None:
+            value, timestamp = cached
+            if time.monotonic() - timestamp < self.cache_ttl:
+                return value
+
+        value = setting.cast(self._query(setting.query))
+
+        # only cache the reading if nothing has been changed since it was requested
+        with self._cache_lock:
+            if self._cache_generation == generation:
+                self._cache[setting.name] = (value, time.monotonic())
+
+        return value
+
+    @_on_worker
+    def _write(self, changes):
+        """Write one or more numeric settings on a single command line.
+
+        Parameters
+        ----------
+        changes : list of tuple
+            (setting, value) pairs to write, in order.
+        """
+        cmd = b" ".join(
+            setting.set_fmt % setting.cast(value) for setting, value in changes
+        )
+
+        for setting, _ in changes:
+            self._invalidate(setting.name)
+
+        self._command(cmd + _WRITE_TERMINATION)
+
+    def _invalidate(self, name):
+        """Drop cached values that setting a property makes stale.
+
+        Parameters
+        ----------
+        name : str or None
+            Name of the property being set, or `None` when disconnecting.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_generation += 1
+
+        # a different turret carries a different set of gratings
+        if name == "turret":
+            self._grating_info_cache = None
+
+    def _scan(self, wavelength, cmd):
+        """Run a wavelength scan command, allowing for the time the scan takes.
+
+        Parameters
+        ----------
+        wavelength : float
+            Target wavelength in nm.
+        cmd : bytes
+            Scan command, including the write termination.
+
+        Returns
+        -------
+        resp : bytes
+            Raw response to the scan command.
+        """
         # calculate scan time in ms
         scan_time = abs(wavelength - self.wavelength) * 60000 / self.scan_speed
 
@@ -119,46 +529,84 @@ class sp2150:
             self.instr.timeout = scan_time + 5000
 
         # run the scan
-        self.instr.query(f"{float(wavelength):.1f} NM")
+        self._invalidate("wavelength")
+        try:
+            return self._command(cmd)
+        finally:
+            # reset timeout if needed, even if the scan failed
+            if long_scan:
+                self.instr.timeout = old_timeout
+
+    @_on_worker
+    def scan_to_wavelength(self, wavelength):
+        """Scan grating to wavelength in nm."""
+        self._scan(wavelength, _CMD_NM % float(wavelength))
 
-        # reset timeout if needed
-        if long_scan:
-            self.instr.timeout = old_timeout
+    @_on_worker
+    def scan_to_wavelength_sync(self, wavelength):
+        """Scan grating to wavelength in nm and return the wavelength reached.
 
-    @property
-    def wavelength(self):
-        """Get current grating wavelength position in nm."""
-        return float(self._query("?NM"))
+        The wavelength query is sent on the same command line as the scan so the
+        final position is confirmed without another round-trip.
+        """
+        cmd = _CMD_NM_VERIFY % float(wavelength)
+        resp = self._scan(wavelength, cmd)
 
-    @wavelength.setter
-    def wavelength(self, wavelength):
-        """Set grating position for wavelength in nm."""
-        self.instr.query(f"{float(wavelength):.1f} GOTO")
+        reached = float(_parse_number(cmd, resp.decode("ASCII")))
+        with self._cache_lock:
+            self._cache["wavelength"] = (reached, time.monotonic())
 
-    @property
-    def grating(self):
-        """Get grating number."""
-        return int(self._query("?GRATING"))
+        return reached
 
-    @grating.setter
-    def grating(self, grating):
-        """Set grating number."""
-        self.instr.query(f"{int(grating)} GRATING")
+    def sweep(self, wavelengths):
+        """Step the grating through a sequence of wavelengths in nm.
 
-    @property
-    def turret(self):
-        """Get turret number."""
-        return int(self._query("?TURRET"))
+        All commands are formatted before the sweep starts. Each wavelength is
+        yielded once the grating has reached it so a measurement can be made at every
+        step, e.g. `for wl in mono.sweep(wls): measure()`.
+
+        Parameters
+        ----------
+        wavelengths : iterable of float
+            Wavelengths to visit in order.
+
+        Yields
+        ------
+        wavelength : float
+            Wavelength the grating has just moved to.
+        """
+        wavelengths = [float(wl) for wl in wavelengths]
+        cmds = [_CMD_GOTO % wl + _WRITE_TERMINATION for wl in wavelengths]
+
+        for wavelength, cmd in zip(wavelengths, cmds):
+            self._command(cmd)
 
-    @turret.setter
-    def turret(self, turret):
-        """Set turrent number."""
-        self.instr.query(f"{int(turret)} TURRET")
+            # invalidate once the move is done since this runs on the caller's thread,
+            # so readings queued before the move can't be cached afterwards
+            self._invalidate("wavelength")
+            yield wavelength
 
     @property
     def grating_info(self):
         """Get groove spacing and blaze wavelength of each grating."""
-        return self._query_manual("?GRATINGS")
+        return self._grating_info()
+
+    @_on_worker
+    def _grating_info(self):
+        """Read the grating table, reusing it until the turret changes.
+
+        Runs on the worker so it can't interleave with a turret change, which would
+        otherwise let the table of the old turret be cached.
+
+        Returns
+        -------
+        resp : str
+            Response to the grating table query.
+        """
+        if self._grating_info_cache is None:
+            self._grating_info_cache = self._query_manual("?GRATINGS")
+
+        return self._grating_info_cache
 
     # TODO: figure out why this command isn't recognised
     # @property
@@ -166,93 +614,24 @@ class sp2150:
     #     """Get groove spacing of each grating on each turret."""
     #     return self._query_manual("?TURRETS")
 
-    @property
-    def filter(self):
-        """Get filter wheel position number."""
-        return int(self._query("?FILTER"))
-
-    @filter.setter
-    def filter(self, filter_pos):
-        """Set filter wheel position number."""
-        self.instr.query(f"{int(filter_pos)} FILTER")
-
+    @_on_worker
     def home_filter(self):
         """Set filter wheel to home position."""
-        self.instr.query("FHOME")
+        self._invalidate("filter")
+        self._command(_CMD_FHOME)
 
 
 if __name__ == "__main__":
-    import argparse
-
-    # set up cli
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-n", "--resource-name", help="Instrument resource name")
-    parser.add_argument(
-        "function",
-        help="function to call",
-        choices=[
-            "set_scan_speed",
-            "get_scan_speed",
-            "scan_to_wavelength",
-            "goto_wavelength",
-            "get_wavelength",
-            "set_grating",
-            "get_grating",
-            "set_turret",
-            "get_turret",
-            "get_grating_info",
-            "set_filter",
-            "get_filter",
-            "home_filter",
-        ],
-    )
-    parser.add_argument(
-        "-p",
-        "--parameter",
-        help=(
-            "Parameter for function, i.e. wavelength in nm, grating number, turret "
-            + "number, filter number"
-        ),
-    )
-    parser.add_argument(
-        "-t",
-        "--timeout",
-        type=int,
-        help=("Communications timeout in ms"),
-        default=30000,
-    )
-    args = parser.parse_args()
-
-    # run command in context manager to ensure proper cleanup
+    if __package__:
+        from ._cli import _parse_args, _run
+    else:
+        from _cli import _parse_args, _run
+
+    args = _parse_args(with_timeout=True)
+
+    # run commands in context manager to ensure proper cleanup
     with sp2150() as mono:
         mono.connect(args.resource_name, timeout=args.timeout)
 
-        # call function
-        if args.function == "set_scan_speed":
-            mono.scan_speed = args.parameter
-        elif args.function == "get_scan_speed":
-            print(mono.scan_speed)
-        elif args.function == "scan_to_wavelength":
-            mono.scan_to_wavelength(args.parameter)
-        elif args.function == "goto_wavelength":
-            mono.wavelength = args.parameter
-        elif args.function == "get_wavelength":
-            print(mono.wavelength)
-        elif args.function == "set_grating":
-            mono.grating = args.parameter
-        elif args.function == "get_grating":
-            print(mono.grating)
-        elif args.function == "set_turret":
-            mono.turret = args.parameter
-        elif args.function == "get_turret":
-            print(mono.turret)
-        elif args.function == "get_grating_info":
-            print(mono.grating_info)
-        # elif args.function == "get_turret_info":
-        #     print(mono.turret_info)
-        elif args.function == "set_filter":
-            mono.filter = args.parameter
-        elif args.function == "get_filter":
-            print(mono.filter)
-        elif args.function == "home_filter":
-            mono.home_filter()
+        # call functions
+        asyncio.run(_run(mono, args.function, args.parameter))
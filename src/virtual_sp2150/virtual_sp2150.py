@@ -1,31 +1,72 @@
 """Acton SP2150 monochromator control library."""
 
+if not __package__:
+    # run as a script rather than as part of the package, so make the sibling sp2150
+    # package that provides the shared base class importable
+    import os
+    import sys
 
-class sp2150:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sp2150._base import SETTINGS, _add_settings, sp2150_base
+
+
+def _state_accessors(setting):
+    """Build a getter and setter that use a setting's value in `_state` directly.
+
+    This skips the `_read`/`_write` hooks, making the mock cheap to call in tight
+    simulation loops.
+
+    Parameters
+    ----------
+    setting : _Setting
+        Description of the setting.
+
+    Returns
+    -------
+    fget, fset : callable
+        Getter and setter for the setting.
+    """
+    name = setting.name
+
+    def fget(self):
+        return self._state[name]
+
+    def fset(self, value):
+        self._state[name] = value
+
+    return fget, fset
+
+
+@_add_settings(_state_accessors)
+class sp2150(sp2150_base):
     """Monochromator instrument object."""
 
+    __slots__ = (
+        "_state",
+        "_grating_info",
+        "_turret_info",
+        "_write_termination",
+        "_read_termination",
+        "instr",
+    )
+
     def __init__(self):
         """Initialise with dummy parameters."""
-        self._scan_speed = 1000
-        self._wavelength = 0
-        self._grating = 1
-        self._turret = 1
+        self._state = {
+            "scan_speed": 1000,
+            "wavelength": 0,
+            "grating": 1,
+            "turret": 1,
+            "filter": 1,
+        }
         self._grating_info = "dummy info"
         self._turret_info = "dummy info"
-        self._filter = 1
 
         self._write_termination = "\r"
         self._read_termination = " ok\r\n"
         self.instr = None
 
-    def __enter__(self):
-        """Enter the runtime context related to this object."""
-        return self
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        """Exit the runtime context related to this object."""
-        self.disconnect()
-
     def connect(self, resource_name, resource_manager=None, **resource_kwargs):
         """Connect to the instrument.
 
@@ -48,6 +89,71 @@ class sp2150:
         """Disconnect instrument."""
         pass
 
+    async def _arun(self, func, *args, **kwargs):
+        """Run an instrument call from a coroutine.
+
+        Parameters
+        ----------
+        func : callable
+            Function to call.
+        args : tuple
+            Positional arguments passed to `func`.
+        kwargs : dict
+            Keyword arguments passed to `func`.
+
+        Returns
+        -------
+        result
+            Return value of `func`.
+        """
+        return func(*args, **kwargs)
+
+    async def aquery(self, cmd):
+        """Query a command asynchronously.
+
+        Parameters
+        ----------
+        cmd : str
+            Command to query.
+
+        Returns
+        -------
+        resp : str
+            Response to command.
+        """
+        pass
+
+    async def aget(self, name):
+        """Get a property asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Property name, e.g. "wavelength".
+
+        Returns
+        -------
+        value
+            Property value.
+        """
+        return getattr(self, name)
+
+    async def aset(self, name, value):
+        """Set a property asynchronously.
+
+        Parameters
+        ----------
+        name : str
+            Property name, e.g. "wavelength".
+        value
+            New property value.
+        """
+        setattr(self, name, value)
+
+    async def ascan_to_wavelength(self, wavelength):
+        """Scan grating to wavelength in nm asynchronously."""
+        self.scan_to_wavelength(wavelength)
+
     def _query(self, cmd):
         """Query a command, stripping space at beginning of response and the unit.
 
@@ -70,49 +176,52 @@ class sp2150:
         """
         pass
 
-    @property
-    def scan_speed(self):
-        """Get grating scan speed in nm/min."""
-        return self._scan_speed
+    def snapshot(self):
+        """Read all numeric instrument settings in a single query.
 
-    @scan_speed.setter
-    def scan_speed(self, speed):
-        """Set grating scan speed in nm/min."""
-        self._scan_speed = speed
+        Returns
+        -------
+        state : dict
+            Current wavelength, grating, turret, filter, and scan speed.
+        """
+        return {setting.name: self._state[setting.name] for setting in SETTINGS}
 
-    def scan_to_wavelength(self, wavelength):
-        """Scan grating to wavelength in nm."""
-        self._wavelength = wavelength
+    def _write(self, changes):
+        """Write one or more numeric settings.
 
-    @property
-    def wavelength(self):
-        """Get current grating wavelength position in nm."""
-        return self._wavelength
+        Parameters
+        ----------
+        changes : list of tuple
+            (setting, value) pairs to write, in order.
+        """
+        for setting, value in changes:
+            self._state[setting.name] = value
 
-    @wavelength.setter
-    def wavelength(self, wavelength):
-        """Set grating position for wavelength in nm."""
-        self._wavelength = wavelength
+    def scan_to_wavelength(self, wavelength):
+        """Scan grating to wavelength in nm."""
+        self._state["wavelength"] = wavelength
 
-    @property
-    def grating(self):
-        """Get grating number."""
-        return self._grating
+    def scan_to_wavelength_sync(self, wavelength):
+        """Scan grating to wavelength in nm and return the wavelength reached."""
+        self._state["wavelength"] = wavelength
+        return self._state["wavelength"]
 
-    @grating.setter
-    def grating(self, grating):
-        """Set grating number."""
-        self._grating = grating
+    def sweep(self, wavelengths):
+        """Step the grating through a sequence of wavelengths in nm.
 
-    @property
-    def turret(self):
-        """Get turret number."""
-        return self._turret
+        Parameters
+        ----------
+        wavelengths : iterable of float
+            Wavelengths to visit in order.
 
-    @turret.setter
-    def turret(self, turret):
-        """Set turrent number."""
-        self._turret = turret
+        Yields
+        ------
+        wavelength : float
+            Wavelength the grating has just moved to.
+        """
+        for wavelength in wavelengths:
+            self._state["wavelength"] = wavelength
+            yield wavelength
 
     @property
     def grating_info(self):
@@ -124,86 +233,21 @@ class sp2150:
         """Get groove spacing of each grating on each turret."""
         return self._turret_info
 
-    @property
-    def filter(self):
-        """Get filter wheel position number."""
-        return self._filter
-
-    @filter.setter
-    def filter(self, filter_pos):
-        """Set filter wheel position number."""
-        self._filter = filter_pos
-
     def home_filter(self):
         """Set filter wheel to home position."""
-        self._filter = 1
+        self._state["filter"] = 1
 
 
 if __name__ == "__main__":
-    import argparse
-
-    # set up cli
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-n", "--resource-name", help="Instrument resource name")
-    parser.add_argument(
-        "function",
-        help="function to call",
-        choices=[
-            "set_scan_speed",
-            "get_scan_speed",
-            "scan_to_wavelength",
-            "goto_wavelength",
-            "get_wavelength",
-            "set_grating",
-            "get_grating",
-            "set_turret",
-            "get_turret",
-            "get_grating_info",
-            "set_filter",
-            "get_filter",
-            "home_filter",
-        ],
-    )
-    parser.add_argument(
-        "-p",
-        "--parameter",
-        help=(
-            "parameter for function, i.e. wavelength in nm, grating number, turret "
-            + "number, filter number"
-        ),
-    )
-    args = parser.parse_args()
+    import asyncio
+
+    from sp2150._cli import _parse_args, _run
+
+    args = _parse_args(with_timeout=False)
 
-    # run command in context manager to ensure proper cleanup
+    # run commands in context manager to ensure proper cleanup
     with sp2150() as mono:
         mono.connect(args.resource_name)
 
-        # call function
-        if args.function == "set_scan_speed":
-            mono.scan_speed = args.parameter
-        elif args.function == "get_scan_speed":
-            print(mono.scan_speed)
-        elif args.function == "scan_to_wavelength":
-            mono.scan_to_wavelength(args.parameter)
-        elif args.function == "goto_wavelength":
-            mono.wavelength = args.parameter
-        elif args.function == "get_wavelength":
-            print(mono.wavelength)
-        elif args.function == "set_grating":
-            mono.grating = args.parameter
-        elif args.function == "get_grating":
-            print(mono.grating)
-        elif args.function == "set_turret":
-            mono.turret = args.parameter
-        elif args.function == "get_turret":
-            print(mono.turret)
-        elif args.function == "get_grating_info":
-            print(mono.grating_info)
-        # elif args.function == "get_turret_info":
-        #     print(mono.turret_info)
-        elif args.function == "set_filter":
-            mono.filter = args.parameter
-        elif args.function == "get_filter":
-            print(mono.filter)
-        elif args.function == "home_filter":
-            mono.home_filter()
+        # call functions
+        asyncio.run(_run(mono, args.function, args.parameter))
@@ -0,0 +1,139 @@
+"""Tests for the worker thread, query sharing, and reading cache of sp2150."""
+
+import threading
+import time
+import unittest
+
+from sp2150 import sp2150
+
+
+class FakeResource:
+    """Minimal stand-in for a PyVISA resource connected to an SP2150.
+
+    Wavelength queries wait on `gate` so tests can hold a query in flight.
+    """
+
+    def __init__(self):
+        self.wavelength = 500.0
+        self.queries = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.timeout = 2000
+        self._resp = b""
+
+    def query(self, cmd):
+        self.queries.append(cmd)
+        if cmd == "?NM":
+            self.gate.wait()
+            return f" {self.wavelength:.3f} nm"
+
+        return ""
+
+    def write_raw(self, cmd):
+        value, name = cmd.decode("ASCII").split()
+        if name == "GOTO":
+            self.wavelength = float(value)
+        self._resp = b" ok\r\n"
+
+    def read_raw(self, size=None):
+        return self._resp
+
+    def close(self):
+        pass
+
+
+class FakeResourceManager:
+    """Resource manager that always opens the same fake resource."""
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    def open_resource(self, resource_name, **resource_kwargs):
+        return self.resource
+
+
+class LookupCountingDict(dict):
+    """Dictionary that signals `lookups` each time `get` is called."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = threading.Semaphore(0)
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        self.lookups.release()
+        return value
+
+
+class TestWorker(unittest.TestCase):
+    def setUp(self):
+        self.instr = FakeResource()
+        self.mono = sp2150()
+        self.mono.connect("FAKE::INSTR", FakeResourceManager(self.instr))
+
+    def tearDown(self):
+        self.instr.gate.set()
+        self.mono.disconnect()
+
+    def test_identical_queries_are_shared(self):
+        self.mono.cache_ttl = 0
+        self.mono._inflight = LookupCountingDict()
+        self.instr.gate.clear()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.mono.wavelength))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # wait until every thread has looked up the query that is held in flight
+        for _ in threads:
+            self.assertTrue(self.mono._inflight.lookups.acquire(timeout=5))
+        self.assertIn("?NM", self.mono._inflight)
+        self.instr.gate.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [500.0] * 5)
+        self.assertEqual(self.instr.queries.count("?NM"), 1)
+
+    def test_read_after_setter_sees_new_value(self):
+        self.mono.cache_ttl = 60
+        self.assertEqual(self.mono.wavelength, 500.0)
+
+        self.mono.wavelength = 600
+
+        self.assertEqual(self.mono.wavelength, 600.0)
+
+    def test_reading_in_flight_during_setter_is_not_cached(self):
+        self.mono.cache_ttl = 60
+        query = self.mono._query
+
+        def slow_query(cmd):
+            resp = query(cmd)
+            # hold the old reading until after the setter has finished
+            if threading.current_thread().name == "reader":
+                time.sleep(0.2)
+            return resp
+
+        self.mono._query = slow_query
+
+        self.instr.gate.clear()
+        reader = threading.Thread(target=lambda: self.mono.wavelength, name="reader")
+        reader.start()
+        time.sleep(0.05)
+
+        setter = threading.Thread(target=setattr, args=(self.mono, "wavelength", 600))
+        setter.start()
+        time.sleep(0.05)
+        self.instr.gate.set()
+        setter.join()
+        reader.join()
+
+        self.assertEqual(self.mono.wavelength, 600.0)
+
+
+if __name__ == "__main__":
+    unittest.main()